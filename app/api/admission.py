@@ -0,0 +1,296 @@
+import ipaddress
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from flask import Flask, Response, g, jsonify, request
+from export import EXPORT_MIMETYPES
+from logger import get_logger
+from profiling import stage
+
+logger = get_logger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+
+# Size of the waitress thread pool serving the API and how many of its threads are kept for the reserved lane
+WORKERS = int(os.getenv("API_WORKERS", "16"))
+RESERVED_WORKERS = int(os.getenv("ADMISSION_RESERVED_WORKERS", "4"))
+
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "10"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "40"))
+MAX_TRACKED_CLIENTS = 10000
+
+# Peers allowed to report the client address in X-Real-IP, normally the frontend nginx pods
+TRUSTED_PROXY_CIDRS = os.getenv("TRUSTED_PROXY_CIDRS", "")
+
+# Cheap lookups that must never wait behind cluster-wide work
+RESERVED_ENDPOINTS = {
+    "health",
+    "namespaces",
+    "get_single_pod",
+    "get_single_deployment",
+    "transport_metrics",
+    "admission_metrics",
+    "cache_metrics",
+}
+
+# Endpoints that are never rate limited (probes and scrapers)
+UNMETERED_ENDPOINTS = {"health", "transport_metrics", "admission_metrics", "cache_metrics"}
+
+# Endpoints where namespace=all is a cluster-wide request, with the namespace each one defaults to
+CLUSTER_WIDE_ENDPOINTS = {"get_graph": "default", "pods": "all", "services": "all", "deployments": "all"}
+
+# List endpoints that stream an export when given a format
+EXPORT_ENDPOINTS = {"pods", "services", "deployments"}
+
+# lane -> (max concurrent, max queued, max wait in seconds)
+LANE_LIMITS: Dict[str, Tuple[int, int, float]] = {
+    "get_graph:all": (1, 2, 15.0),
+    "get_graph": (2, 4, 10.0),
+    "pods:all": (2, 4, 10.0),
+    "services:all": (2, 4, 10.0),
+    "deployments:all": (2, 4, 10.0),
+    "pod_logs": (4, 8, 5.0),
+    # Exports hold their slot for the whole stream, so they queue separately from the dashboard
+    "export:ndjson": (2, 2, 30.0),
+    "export:arrow": (1, 2, 30.0),
+    "export:parquet": (1, 2, 30.0),
+}
+DEFAULT_LANE_LIMITS: Tuple[int, int, float] = (8, 16, 5.0)
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Lane:
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.queued = 0
+        # Moving average of how long a request holds a slot, used to predict queue wait
+        self.avg_service_time = 0.5
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            if self.active < self.max_concurrent and self.queued == 0:
+                self.active += 1
+                return
+
+            expected_wait = self._expected_wait(self.queued + 1)
+            if self.queued >= self.max_queue:
+                raise Rejected(f"{self.name} queue is full", expected_wait)
+            if expected_wait > self.max_wait:
+                # Reject now rather than hold a worker for a request that will time out anyway
+                raise Rejected(f"{self.name} queue wait would exceed {self.max_wait}s", expected_wait)
+
+            self.queued += 1
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while self.active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Rejected(f"{self.name} queue wait exceeded {self.max_wait}s", self._expected_wait(self.queued))
+                    self._cond.wait(remaining)
+                self.active += 1
+            finally:
+                self.queued -= 1
+
+    def release(self, elapsed: float) -> None:
+        with self._cond:
+            self.active -= 1
+            self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * elapsed
+            self._cond.notify()
+
+    def _expected_wait(self, position: int) -> float:
+        return math.ceil(position / self.max_concurrent) * self.avg_service_time
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "active": self.active,
+                "queued": self.queued,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "avg_service_time": round(self.avg_service_time, 3),
+            }
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> Optional[float]:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return None
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    def __init__(self):
+        self.lanes: Dict[str, Lane] = {}
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.shared_in_use = 0
+        self.shared_capacity = max(WORKERS - RESERVED_WORKERS, 1)
+        self.rejections = 0
+        self._lock = threading.Lock()
+
+    def admit(self, endpoint: Optional[str], lane_name: str, client_key: str) -> Optional[Lane]:
+        if endpoint not in UNMETERED_ENDPOINTS:
+            self._rate_limit(client_key)
+        if endpoint is None or endpoint in RESERVED_ENDPOINTS:
+            return None
+
+        lane = self._lane(lane_name)
+        with self._lock:
+            # Queued requests hold a worker too, so they count against the shared budget
+            if self.shared_in_use >= self.shared_capacity:
+                self.rejections += 1
+                raise Rejected("no shared workers available", lane.avg_service_time)
+            self.shared_in_use += 1
+        try:
+            with stage("admission.queue"):
+                lane.acquire()
+        except Rejected:
+            self._release_shared()
+            with self._lock:
+                self.rejections += 1
+            raise
+        return lane
+
+    def release(self, lane: Lane, elapsed: float) -> None:
+        lane.release(elapsed)
+        self._release_shared()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lanes = dict(self.lanes)
+            summary = {
+                "shared_in_use": self.shared_in_use,
+                "shared_capacity": self.shared_capacity,
+                "rejections": self.rejections,
+                "tracked_clients": len(self.buckets),
+            }
+        return {**summary, "lanes": {name: lane.stats() for name, lane in lanes.items()}}
+
+    def _lane(self, name: str) -> Lane:
+        with self._lock:
+            lane = self.lanes.get(name)
+            if lane is None:
+                lane = Lane(name, *LANE_LIMITS.get(name, DEFAULT_LANE_LIMITS))
+                self.lanes[name] = lane
+            return lane
+
+    def _rate_limit(self, client_key: str) -> None:
+        with self._lock:
+            bucket = self.buckets.get(client_key)
+            if bucket is None:
+                if len(self.buckets) >= MAX_TRACKED_CLIENTS:
+                    self._evict_idle_buckets()
+                bucket = TokenBucket(RATE_LIMIT_RPS, RATE_LIMIT_BURST)
+                self.buckets[client_key] = bucket
+            wait = bucket.take()
+            if wait is not None:
+                self.rejections += 1
+                raise Rejected(f"rate limit exceeded for {client_key}", wait)
+
+    def _evict_idle_buckets(self) -> None:
+        now = time.monotonic()
+        idle_after = RATE_LIMIT_BURST / RATE_LIMIT_RPS
+        self.buckets = {k: b for k, b in self.buckets.items() if now - b.updated < idle_after}
+        if len(self.buckets) >= MAX_TRACKED_CLIENTS:
+            # Still full of active clients, keep the most recently seen ones
+            recent = sorted(self.buckets.items(), key=lambda item: item[1].updated, reverse=True)
+            self.buckets = dict(recent[:MAX_TRACKED_CLIENTS * 9 // 10])
+
+    def _release_shared(self) -> None:
+        with self._lock:
+            self.shared_in_use -= 1
+
+
+def _parse_networks(value: str) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    networks = []
+    for cidr in filter(None, (part.strip() for part in value.split(","))):
+        try:
+            networks.append(ipaddress.ip_network(cidr, strict=False))
+        except ValueError:
+            logger.error(f"Ignoring invalid TRUSTED_PROXY_CIDRS entry {cidr}")
+    return networks
+
+
+controller = AdmissionController()
+trusted_proxies = _parse_networks(TRUSTED_PROXY_CIDRS)
+
+
+def _trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+# X-Real-IP is only believed from a trusted proxy, anyone else could pick a new rate limit bucket per request
+def _client_key() -> str:
+    peer = request.remote_addr or "unknown"
+    real_ip = request.headers.get("X-Real-IP", "").strip()
+    if real_ip and _trusted_proxy(peer):
+        return real_ip
+    return peer
+
+def _lane_name() -> str:
+    endpoint = request.endpoint
+    fmt = request.args.get("format")
+    if endpoint in EXPORT_ENDPOINTS and fmt in EXPORT_MIMETYPES:
+        # A minutes long export must not take interactive slots or inflate their service time
+        return f"export:{fmt}"
+    default = CLUSTER_WIDE_ENDPOINTS.get(endpoint)
+    if default is not None and request.args.get("namespace", default) == "all":
+        return f"{endpoint}:all"
+    return endpoint or "unknown"
+
+def _reject(e: Rejected) -> Tuple[Response, int]:
+    retry_after = max(1, math.ceil(e.retry_after))
+    logger.warning(f"Rejected {request.method} {request.path}: {e.reason} (retry after {retry_after}s)")
+    response = jsonify({"error": "Server busy, retry later", "reason": e.reason})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 429
+
+def init_admission(app: Flask) -> None:
+    if not ADMISSION_ENABLED:
+        logger.info("Admission control disabled.")
+        return
+
+    @app.before_request
+    def admit_request():
+        try:
+            lane = controller.admit(request.endpoint, _lane_name(), _client_key())
+        except Rejected as e:
+            return _reject(e)
+        if lane is not None:
+            g.admission_lane = lane
+            g.admission_started = time.monotonic()
+
+    @app.teardown_request
+    def release_request(exc):
+        lane = g.pop("admission_lane", None)
+        if lane is not None:
+            controller.release(lane, time.monotonic() - g.pop("admission_started"))
+
+def get_admission_metrics() -> Dict[str, object]:
+    return controller.stats()
@@ -0,0 +1,293 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from werkzeug.http import http_date
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "15"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+KEY_PREFIX = "pandak8s:"
+# How long a fill lock is held at most, and how long other callers wait for it when there is no previous bucket
+CACHE_FILL_LOCK_SECONDS = int(os.getenv("CACHE_FILL_LOCK_SECONDS", "30"))
+CACHE_FILL_WAIT_SECONDS = float(os.getenv("CACHE_FILL_WAIT_SECONDS", "10"))
+FILL_POLL_SECONDS = 0.05
+
+
+class CacheBackend:
+    name = "none"
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        pass
+
+    # Set only if absent, used as a fill lock shared by every replica. Backends private to one process
+    # are already covered by the in-process lock
+    def add(self, key: str, value: bytes, ttl: int) -> bool:
+        return True
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class LocalLRUCache(CacheBackend):
+    name = "local"
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self.size -= len(value)
+
+
+# In-memory stand-in for a Redis server, speaks the subset of redis-py used by RedisCache
+class FakeRedis:
+    # Seconds between sweeps of expired keys, keys carry their time bucket so most are never read again
+    PURGE_INTERVAL = 1.0
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._next_purge = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            if self._expired(entry, time.monotonic()):
+                del self._data[name]
+                return None
+            return entry[0]
+
+    def set(self, name: str, value: bytes, ex: Optional[int] = None, nx: bool = False) -> Optional[bool]:
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_purge:
+                self._purge(now)
+            if nx and name in self._data and not self._expired(self._data[name], now):
+                return None
+            self._data[name] = (bytes(value), now + ex if ex else None)
+        return True
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+    def dbsize(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def _purge(self, now: float) -> None:
+        self._data = {k: v for k, v in self._data.items() if not self._expired(v, now)}
+        self._next_purge = now + self.PURGE_INTERVAL
+
+    @staticmethod
+    def _expired(entry: Tuple[bytes, Optional[float]], now: float) -> bool:
+        return entry[1] is not None and entry[1] <= now
+
+
+class RedisCache(CacheBackend):
+    name = "redis"
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.errors = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(KEY_PREFIX + key)
+        except Exception as e:
+            # A cache outage must not take the API down, treat it as a miss
+            self.errors += 1
+            logger.warning(f"Redis get failed: {e}")
+            return None
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        try:
+            self.client.set(KEY_PREFIX + key, value, ex=ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Redis set failed: {e}")
+
+    def add(self, key: str, value: bytes, ttl: int) -> bool:
+        try:
+            return bool(self.client.set(KEY_PREFIX + key, value, ex=ttl, nx=True))
+        except Exception as e:
+            # Without Redis there is nothing to coordinate on, let this replica compute
+            self.errors += 1
+            logger.warning(f"Redis set nx failed: {e}")
+            return True
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(KEY_PREFIX + key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Redis delete failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"errors": self.errors}
+
+
+def _json_default(obj: Any) -> Any:
+    # Matches how jsonify renders dates, so cached and fresh responses are identical
+    if isinstance(obj, date):
+        return http_date(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class ResponseCache:
+    def __init__(self, backend: CacheBackend, ttl: int = CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.previous_hits = 0
+        self.fill_waits = 0
+        self._fills: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    # Results are keyed by kind, namespace and a wall clock bucket of ttl seconds, which every replica agrees on
+    # without asking the API server, so a result is at most ttl seconds old. Every replica's bucket ends at the
+    # same instant, so a miss is filled by a single caller while the others answer from the previous bucket
+    def get_or_compute(self, kind: str, namespace: str, compute: Callable[[], Any]) -> Any:
+        if self.ttl <= 0 or self.backend.name == "none":
+            return compute()
+
+        bucket = int(time.time() // self.ttl)
+        key = f"{kind}:{namespace}:{bucket}"
+        cached = self._get(key, "hits")
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            fill = self._fills.setdefault(key, threading.Lock())
+        if not fill.acquire(blocking=False):
+            previous = self._get(f"{kind}:{namespace}:{bucket - 1}", "previous_hits")
+            if previous is not None:
+                return previous
+            self._count("fill_waits")
+            if not fill.acquire(timeout=CACHE_FILL_WAIT_SECONDS):
+                self._count("misses")
+                return compute()
+        try:
+            cached = self._get(key, "hits")
+            if cached is not None:
+                return cached
+            return self._fill(key, f"{kind}:{namespace}:{bucket - 1}", compute)
+        finally:
+            fill.release()
+            with self._lock:
+                if self._fills.get(key) is fill:
+                    del self._fills[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {"hits": self.hits, "misses": self.misses, "previous_hits": self.previous_hits,
+                        "fill_waits": self.fill_waits}
+        return {"backend": self.backend.name, "ttl": self.ttl, **counters, **self.backend.stats()}
+
+    # Computes under a fill lock shared through the backend, so only one replica lists upstream per bucket
+    def _fill(self, key: str, previous_key: str, compute: Callable[[], Any]) -> Any:
+        lock_key = f"{key}:fill"
+        owner = self.backend.add(lock_key, b"1", CACHE_FILL_LOCK_SECONDS)
+        if not owner:
+            previous = self._get(previous_key, "previous_hits")
+            if previous is not None:
+                return previous
+            self._count("fill_waits")
+            deadline = time.monotonic() + CACHE_FILL_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(FILL_POLL_SECONDS)
+                cached = self._get(key, "hits")
+                if cached is not None:
+                    return cached
+
+        self._count("misses")
+        try:
+            value = compute()
+            now = time.time()
+            # Outlive the bucket by one ttl, so the next bucket's fill can be answered from this one
+            expires_in = max(1, math.ceil(2 * self.ttl - now % self.ttl))
+            self.backend.set(key, json.dumps(value, separators=(",", ":"), default=_json_default).encode(), expires_in)
+        finally:
+            if owner:
+                self.backend.delete(lock_key)
+        return value
+
+    def _get(self, key: str, counter: str) -> Any:
+        cached = self.backend.get(key)
+        if cached is None:
+            return None
+        self._count(counter)
+        return json.loads(cached)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            setattr(self, key, getattr(self, key) + 1)
+
+
+def create_backend(name: str = CACHE_BACKEND) -> CacheBackend:
+    if name == "local":
+        return LocalLRUCache()
+    if name == "fake-redis":
+        return RedisCache(FakeRedis())
+    if name == "redis":
+        try:
+            import redis
+        except ImportError:
+            logger.error("CACHE_BACKEND=redis requires the redis package, falling back to the local cache.")
+            return LocalLRUCache()
+        return RedisCache(redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5))
+    if name != "none":
+        logger.error(f"Unknown CACHE_BACKEND {name}, caching disabled.")
+    return CacheBackend()
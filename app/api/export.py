@@ -0,0 +1,126 @@
+import json
+from typing import Any, Dict, Iterable, Iterator, List
+
+from flask import json as flask_json
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+EXPORT_MIMETYPES = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Columns written for columnar exports, dict and list values are stored as JSON strings
+COLUMNS: Dict[str, List[str]] = {
+    "pod": ["name", "namespace", "creationTimestamp", "labels", "annotations", "uid", "resourceVersion",
+            "generateName", "status", "node", "restartCount"],
+    "service": ["name", "namespace", "creationTimestamp", "labels", "annotations", "uid", "resourceVersion",
+                "generateName", "type", "clusterIP", "ports"],
+    "deployment": ["name", "namespace", "creationTimestamp", "labels", "annotations", "uid", "resourceVersion",
+                   "generateName", "replicas", "availableReplicas", "strategy"],
+}
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+# Collects what pyarrow writes so it can be yielded to the client chunk by chunk
+class _ChunkSink:
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _require_pyarrow() -> Any:
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ExportUnavailable("Arrow and Parquet exports require the pyarrow package") from e
+    return pyarrow
+
+def check_format(fmt: str) -> None:
+    if fmt not in EXPORT_MIMETYPES:
+        raise ValueError(f"Unsupported format {fmt}, expected one of: {', '.join(EXPORT_MIMETYPES)}")
+    if fmt in ("arrow", "parquet"):
+        _require_pyarrow()
+
+def stream_ndjson(pages: Iterable[List[Dict[str, Any]]]) -> Iterator[str]:
+    try:
+        for page in pages:
+            # Same encoder as jsonify, so datetimes in pod metadata serialize identically
+            yield "".join(flask_json.dumps(obj, separators=(",", ":")) + "\n" for obj in page)
+    except Exception as e:
+        # Headers are already sent, so report the failure as a final record
+        logger.error(f"NDJSON export aborted: {e}")
+        yield json.dumps({"error": str(e)}) + "\n"
+
+def _record_batch(pa: Any, schema: Any, page: List[Dict[str, Any]]) -> Any:
+    columns = []
+    for column in schema.names:
+        values = [obj.get(column) for obj in page]
+        columns.append(pa.array(
+            [flask_json.dumps(v, separators=(",", ":")) if isinstance(v, (dict, list)) else v for v in values],
+            type=pa.string(),
+        ))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+def _schema(pa: Any, kind: str) -> Any:
+    return pa.schema([(column, pa.string()) for column in COLUMNS[kind]])
+
+def stream_arrow(pages: Iterable[List[Dict[str, Any]]], kind: str) -> Iterator[bytes]:
+    pa = _require_pyarrow()
+    schema = _schema(pa, kind)
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    yield sink.drain()
+    for page in pages:
+        writer.write_batch(_record_batch(pa, schema, page))
+        yield sink.drain()
+    # Only a completed export gets the end-of-stream marker, so readers can tell a truncated one apart
+    writer.close()
+    yield sink.drain()
+
+def stream_parquet(pages: Iterable[List[Dict[str, Any]]], kind: str) -> Iterator[bytes]:
+    pa = _require_pyarrow()
+    schema = _schema(pa, kind)
+    sink = _ChunkSink()
+    writer = pa.parquet.ParquetWriter(sink, schema, compression="zstd")
+    # One row group per upstream page, the footer is only written once every page arrived
+    for page in pages:
+        writer.write_batch(_record_batch(pa, schema, page))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def stream_export(pages: Iterable[List[Dict[str, Any]]], kind: str, fmt: str) -> Iterator[Any]:
+    if fmt == "ndjson":
+        return stream_ndjson(pages)
+    if fmt == "arrow":
+        return stream_arrow(pages, kind)
+    return stream_parquet(pages, kind)
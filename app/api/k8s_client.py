@@ -1,8 +1,15 @@
 from kubernetes import client, config
 from kubernetes.client import V1Pod, V1Service, V1Deployment
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextvars import copy_context
 from datetime import datetime, timezone
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+import os
+import time
 from logger import get_logger
+from transport import Transport, TIMEOUTS
+from profiling import stage
+from cache import ResponseCache, create_backend
 
 logger = get_logger(__name__)
 
@@ -13,8 +20,32 @@ except config.config_exception.ConfigException:
     config.load_kube_config()
     logger.info("Loaded local kube config.")
 
-v1 = client.CoreV1Api()
-apps_v1 = client.AppsV1Api()
+transport = Transport()
+v1 = client.CoreV1Api(transport.api_client)
+apps_v1 = client.AppsV1Api(transport.api_client)
+response_cache = ResponseCache(create_backend())
+
+# (namespaced, all namespaces) list calls per kind
+LIST_CALLS = {
+    "pod": (v1.list_namespaced_pod, v1.list_pod_for_all_namespaces),
+    "service": (v1.list_namespaced_service, v1.list_service_for_all_namespaces),
+    "deployment": (apps_v1.list_namespaced_deployment, apps_v1.list_deployment_for_all_namespaces),
+}
+
+LIST_PAGE_SIZE = int(os.getenv("K8S_LIST_PAGE_SIZE", "500"))
+
+INSPECT_LOG_TAIL_LINES = int(os.getenv("INSPECT_LOG_TAIL_LINES", "200"))
+INSPECT_EVENT_LIMIT = int(os.getenv("INSPECT_EVENT_LIMIT", "20"))
+# Per-section timeouts in seconds for the pod inspection endpoint
+INSPECT_TIMEOUTS = {
+    "pod": float(os.getenv("INSPECT_POD_TIMEOUT", "5")),
+    "logs": float(os.getenv("INSPECT_LOGS_TIMEOUT", "10")),
+    "events": float(os.getenv("INSPECT_EVENTS_TIMEOUT", "5")),
+    "deployment": float(os.getenv("INSPECT_DEPLOYMENT_TIMEOUT", "8")),
+}
+# Threads fetching inspection sections, the transport pool has a connection for each of them
+INSPECT_WORKERS = int(os.getenv("INSPECT_WORKERS", "8"))
+inspect_executor = ThreadPoolExecutor(max_workers=INSPECT_WORKERS, thread_name_prefix="inspect")
 
 # Utility function to remove nulls and empty structures from a dictionary or list
 def remove_nulls(obj: Any) -> Any:
@@ -77,11 +108,43 @@ def format_k8s_resource(obj: Any, kind: str) -> Dict[str, Any]:
 
     return base
 
+# Cached lists
+def _list_call(kind: str, namespace: str) -> Tuple[Any, Tuple[str, ...]]:
+    namespaced, cluster_wide = LIST_CALLS[kind]
+    if namespace == "all":
+        return cluster_wide, ()
+    return namespaced, (namespace,)
+
+# Falls back to the last good result, within the stale store's age limit, when the fetch fails
+def _with_stale(key: str, fetch: Callable[[], List[Any]]) -> List[Any]:
+    try:
+        result = fetch()
+    except Exception:
+        stale = transport.stale.get(key)
+        if stale is None:
+            raise
+        return stale
+    transport.stale.put(key, result)
+    return result
+
+def _list_formatted(kind: str, namespace: str) -> List[Dict[str, Any]]:
+    list_fn, args = _list_call(kind, namespace)
+
+    def fetch() -> List[Dict[str, Any]]:
+        items = transport.call("list", list_fn, *args).items
+        with stage("format"):
+            return [format_k8s_resource(obj, kind) for obj in items]
+
+    return _with_stale(f"{kind}s:{namespace}", fetch)
+
+def cached_list(kind: str, namespace: str) -> List[Dict[str, Any]]:
+    return response_cache.get_or_compute(kind, namespace, lambda: _list_formatted(kind, namespace))
+
 # Namespaces
 def get_namespaces() -> List[str]:
     logger.info("Fetching namespaces...")
     try:
-        result = [ns.metadata.name for ns in v1.list_namespace().items]
+        result = _with_stale("namespaces", lambda: [ns.metadata.name for ns in transport.call("list", v1.list_namespace).items])
         logger.info(f"Found {len(result)} namespaces.")
         return result
     except Exception as e:
@@ -92,8 +155,7 @@ def get_namespaces() -> List[str]:
 def get_pods(namespace: str) -> List[Dict[str, Any]]:
     logger.info(f"Fetching pods in namespace: {namespace}")
     try:
-        pods = v1.list_namespaced_pod(namespace).items
-        return [format_k8s_resource(pod, "pod") for pod in pods]
+        return cached_list("pod", namespace)
     except Exception as e:
         logger.error(f"Error fetching pods: {e}")
         return []
@@ -101,66 +163,67 @@ def get_pods(namespace: str) -> List[Dict[str, Any]]:
 def get_all_pods() -> List[Dict[str, Any]]:
     logger.info("Fetching all pods in all namespaces...")
     try:
-        pods = v1.list_pod_for_all_namespaces(watch=False).items
-        return [format_k8s_resource(pod, "pod") for pod in pods]
+        return cached_list("pod", "all")
     except Exception as e:
         logger.error(f"Error fetching all pods: {e}")
         return []
 
+def format_pod_full(pod: V1Pod) -> Dict[str, Any]:
+    return remove_nulls({
+        "apiVersion": "v1",
+        "items": [
+            {
+                "apiVersion": "v1",
+                "kind": "Pod",
+                "metadata": {
+                    "name": pod.metadata.name,
+                    "namespace": pod.metadata.namespace,
+                    "uid": pod.metadata.uid,
+                    "creationTimestamp": pod.metadata.creation_timestamp.isoformat(),
+                    "labels": pod.metadata.labels,
+                    "resourceVersion": pod.metadata.resource_version,
+                },
+                "spec": {
+                    "containers": [
+                        {
+                            "name": c.name,
+                            "image": c.image,
+                            "imagePullPolicy": c.image_pull_policy,
+                            "resources": c.resources.to_dict() if c.resources else {},
+                            "terminationMessagePath": c.termination_message_path,
+                            "terminationMessagePolicy": c.termination_message_policy,
+                            "volumeMounts": [
+                                {
+                                    "mountPath": vm.mount_path,
+                                    "name": vm.name,
+                                    "readOnly": vm.read_only
+                                } for vm in (c.volume_mounts or [])
+                            ]
+                        } for c in pod.spec.containers
+                    ],
+                    "dnsPolicy": pod.spec.dns_policy,
+                    "enableServiceLinks": pod.spec.enable_service_links,
+                    "nodeName": pod.spec.node_name,
+                    "preemptionPolicy": pod.spec.preemption_policy,
+                    "priority": pod.spec.priority,
+                    "restartPolicy": pod.spec.restart_policy,
+                    "schedulerName": pod.spec.scheduler_name,
+                    "securityContext": pod.spec.security_context.to_dict() if pod.spec.security_context else {},
+                    "serviceAccount": pod.spec.service_account,
+                    "serviceAccountName": pod.spec.service_account_name,
+                    "terminationGracePeriodSeconds": pod.spec.termination_grace_period_seconds,
+                    "tolerations": [t.to_dict() for t in pod.spec.tolerations or []],
+                    "volumes": [v.to_dict() for v in pod.spec.volumes or []],
+                }
+            }
+        ]
+    })
+
 def get_pod_full(namespace: str, name: str) -> Dict[str, Any]:
     logger.info(f"Fetching structured pod object for {name} in namespace {namespace}")
     try:
-        pod: V1Pod = v1.read_namespaced_pod(name=name, namespace=namespace)
-
-        return remove_nulls({
-            "apiVersion": "v1",
-            "items": [
-                {
-                    "apiVersion": "v1",
-                    "kind": "Pod",
-                    "metadata": {
-                        "name": pod.metadata.name,
-                        "namespace": pod.metadata.namespace,
-                        "uid": pod.metadata.uid,
-                        "creationTimestamp": pod.metadata.creation_timestamp.isoformat(),
-                        "labels": pod.metadata.labels,
-                        "resourceVersion": pod.metadata.resource_version,
-                    },
-                    "spec": {
-                        "containers": [
-                            {
-                                "name": c.name,
-                                "image": c.image,
-                                "imagePullPolicy": c.image_pull_policy,
-                                "resources": c.resources.to_dict() if c.resources else {},
-                                "terminationMessagePath": c.termination_message_path,
-                                "terminationMessagePolicy": c.termination_message_policy,
-                                "volumeMounts": [
-                                    {
-                                        "mountPath": vm.mount_path,
-                                        "name": vm.name,
-                                        "readOnly": vm.read_only
-                                    } for vm in (c.volume_mounts or [])
-                                ]
-                            } for c in pod.spec.containers
-                        ],
-                        "dnsPolicy": pod.spec.dns_policy,
-                        "enableServiceLinks": pod.spec.enable_service_links,
-                        "nodeName": pod.spec.node_name,
-                        "preemptionPolicy": pod.spec.preemption_policy,
-                        "priority": pod.spec.priority,
-                        "restartPolicy": pod.spec.restart_policy,
-                        "schedulerName": pod.spec.scheduler_name,
-                        "securityContext": pod.spec.security_context.to_dict() if pod.spec.security_context else {},
-                        "serviceAccount": pod.spec.service_account,
-                        "serviceAccountName": pod.spec.service_account_name,
-                        "terminationGracePeriodSeconds": pod.spec.termination_grace_period_seconds,
-                        "tolerations": [t.to_dict() for t in pod.spec.tolerations or []],
-                        "volumes": [v.to_dict() for v in pod.spec.volumes or []],
-                    }
-                }
-            ]
-        })
+        pod: V1Pod = transport.call("detail", v1.read_namespaced_pod, name=name, namespace=namespace)
+        return format_pod_full(pod)
     except Exception as e:
         logger.error(f"Error fetching full structured pod object: {e}")
         raise
@@ -170,7 +233,7 @@ def patch_pod(pod_name: str, namespace: str, metadata: Dict[str, Any]) -> None:
     logger.info(f"Patching pod {pod_name} in namespace {namespace} with metadata: {metadata}")
     body = {"metadata": metadata}
     try:
-        v1.patch_namespaced_pod(name=pod_name, namespace=namespace, body=body)
+        transport.call("write", v1.patch_namespaced_pod, name=pod_name, namespace=namespace, body=body)
         logger.info(f"Successfully patched pod {pod_name}.")
     except Exception as e:
         logger.error(f"Error patching pod {pod_name}: {e}")
@@ -180,8 +243,7 @@ def patch_pod(pod_name: str, namespace: str, metadata: Dict[str, Any]) -> None:
 def get_services(namespace: str) -> List[Dict[str, Any]]:
     logger.info(f"Fetching services in namespace: {namespace}")
     try:
-        services = v1.list_namespaced_service(namespace).items
-        return [format_k8s_resource(svc, "service") for svc in services]
+        return cached_list("service", namespace)
     except Exception as e:
         logger.error(f"Error fetching services: {e}")
         return []
@@ -189,8 +251,7 @@ def get_services(namespace: str) -> List[Dict[str, Any]]:
 def get_all_services() -> List[Dict[str, Any]]:
     logger.info("Fetching all services in all namespaces...")
     try:
-        services = v1.list_service_for_all_namespaces(watch=False).items
-        return [format_k8s_resource(svc, "service") for svc in services]
+        return cached_list("service", "all")
     except Exception as e:
         logger.error(f"Error fetching all services: {e}")
         return []
@@ -199,8 +260,7 @@ def get_all_services() -> List[Dict[str, Any]]:
 def get_deployments(namespace: str) -> List[Dict[str, Any]]:
     logger.info(f"Fetching deployments in namespace: {namespace}")
     try:
-        deployments = apps_v1.list_namespaced_deployment(namespace).items
-        return [format_k8s_resource(dep, "deployment") for dep in deployments]
+        return cached_list("deployment", namespace)
     except Exception as e:
         logger.error(f"Error fetching deployments: {e}")
         return []
@@ -208,8 +268,7 @@ def get_deployments(namespace: str) -> List[Dict[str, Any]]:
 def get_all_deployments() -> List[Dict[str, Any]]:
     logger.info("Fetching all deployments in all namespaces...")
     try:
-        deployments = apps_v1.list_deployment_for_all_namespaces(watch=False).items
-        return [format_k8s_resource(dep, "deployment") for dep in deployments]
+        return cached_list("deployment", "all")
     except Exception as e:
         logger.error(f"Error fetching all deployments: {e}")
         return []
@@ -217,7 +276,7 @@ def get_all_deployments() -> List[Dict[str, Any]]:
 def get_deployment_full(namespace: str, name: str) -> Dict[str, Any]:
     logger.info(f"Fetching structured deployment object for {name} in namespace {namespace}")
     try:
-        dep: V1Deployment = apps_v1.read_namespaced_deployment(name=name, namespace=namespace)
+        dep: V1Deployment = transport.call("detail", apps_v1.read_namespaced_deployment, name=name, namespace=namespace)
 
         return remove_nulls({
             "apiVersion": "apps/v1",
@@ -269,12 +328,141 @@ def get_deployment_full(namespace: str, name: str) -> Dict[str, Any]:
         raise
 
 
+# Paged listing, used to stream large lists without holding them in memory
+def iter_resource_pages(kind: str, namespace: str, page_size: int = LIST_PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    logger.info(f"Streaming {kind}s in namespace: {namespace} (page size {page_size})")
+    list_fn, args = _list_call(kind, namespace)
+    token = None
+    while True:
+        page = transport.call("list", list_fn, *args, limit=page_size, _continue=token)
+        with stage("format"):
+            items = [format_k8s_resource(obj, kind) for obj in page.items]
+        yield items
+        token = page.metadata._continue
+        if not token:
+            return
+
 # Logs methods
 def get_pod_logs(pod_name: str, namespace: str) -> str:
     logger.info(f"Fetching logs for pod: {pod_name} in namespace: {namespace}")
     try:
-        log = v1.read_namespaced_pod_log(name=pod_name, namespace=namespace, since_seconds=3600)
+        log = transport.call("logs", v1.read_namespaced_pod_log, name=pod_name, namespace=namespace, since_seconds=3600)
         return log
     except Exception as e:
         logger.error(f"Error fetching logs for pod {pod_name}: {e}")
-        return f"Error fetching logs: {str(e)}"
\ No newline at end of file
+        return f"Error fetching logs: {str(e)}"
+
+def get_pod_log_tail(pod_name: str, namespace: str, container: str, tail_lines: int = INSPECT_LOG_TAIL_LINES,
+                     deadline: Optional[float] = None) -> str:
+    return transport.call("logs", v1.read_namespaced_pod_log, name=pod_name, namespace=namespace,
+                          container=container, tail_lines=tail_lines, **_deadline_kwargs("logs", deadline))
+
+# Events methods
+def format_event(event: Any) -> Dict[str, Any]:
+    return {
+        "type": event.type,
+        "reason": event.reason,
+        "message": event.message,
+        "count": event.count or 1,
+        "firstTimestamp": format_datetime(event.first_timestamp),
+        "lastTimestamp": format_datetime(event.last_timestamp or event.event_time or event.first_timestamp),
+        "source": event.source.component if event.source else None,
+    }
+
+def get_events(namespace: str, kind: str, name: str, limit: int = INSPECT_EVENT_LIMIT,
+               deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+    selector = f"involvedObject.kind={kind},involvedObject.name={name}"
+    events = transport.call("list", v1.list_namespaced_event, namespace, field_selector=selector,
+                            **_deadline_kwargs("list", deadline)).items
+    epoch = datetime.min.replace(tzinfo=timezone.utc)
+    events.sort(key=lambda e: e.last_timestamp or e.event_time or e.first_timestamp or epoch, reverse=True)
+    return [format_event(e) for e in events[:limit]]
+
+def get_owner_deployment(pod: V1Pod, deadline: Optional[float] = None) -> Optional[str]:
+    for ref in pod.metadata.owner_references or []:
+        if ref.kind == "Deployment":
+            return ref.name
+        if ref.kind == "ReplicaSet":
+            rs = transport.call("detail", apps_v1.read_namespaced_replica_set, name=ref.name, namespace=pod.metadata.namespace,
+                                **_deadline_kwargs("detail", deadline))
+            for rs_ref in rs.metadata.owner_references or []:
+                if rs_ref.kind == "Deployment":
+                    return rs_ref.name
+    return None
+
+def get_owner_deployment_events(pod: V1Pod, deadline: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    deployment = get_owner_deployment(pod, deadline)
+    if deployment is None:
+        return None
+    return {"name": deployment, "events": get_events(pod.metadata.namespace, "Deployment", deployment, deadline=deadline)}
+
+# Pod inspection
+def _deadline_kwargs(call_type: str, deadline: Optional[float]) -> Dict[str, Any]:
+    if deadline is None:
+        return {}
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        # Waited in the executor past the section timeout, the caller has already given up
+        raise TimeoutError("Section deadline passed before the call started")
+    # The abandoned future keeps running, so the call itself must not outlive the section or retry
+    connect, read = TIMEOUTS[call_type]
+    return {"_request_timeout": (min(connect, remaining), min(read, remaining)), "max_retries": 0}
+
+def _submit(fn: Any, *args: Any, **kwargs: Any) -> Future:
+    # Run in a copy of the caller's context so upstream calls are attributed to the request trace
+    return inspect_executor.submit(copy_context().run, fn, *args, **kwargs)
+
+def _collect(future: Future, deadline: float, section: str, errors: Dict[str, str]) -> Any:
+    try:
+        return future.result(timeout=max(deadline - time.monotonic(), 0))
+    except FutureTimeoutError:
+        future.cancel()
+        errors[section] = "Timed out"
+    except Exception as e:
+        errors[section] = str(e)
+    logger.warning(f"Pod inspection section {section} failed: {errors[section]}")
+    return None
+
+def inspect_pod(namespace: str, name: str, tail_lines: int = INSPECT_LOG_TAIL_LINES) -> Dict[str, Any]:
+    logger.info(f"Inspecting pod {name} in namespace {namespace}")
+    errors: Dict[str, str] = {}
+    started = time.monotonic()
+
+    # Pod events do not depend on the pod object, so fetch them alongside it
+    pod_deadline = started + INSPECT_TIMEOUTS["pod"]
+    events_deadline = started + INSPECT_TIMEOUTS["events"]
+    pod_future = _submit(lambda: transport.call("detail", v1.read_namespaced_pod, name=name, namespace=namespace,
+                                                **_deadline_kwargs("detail", pod_deadline)))
+    events_future = _submit(get_events, namespace, "Pod", name, deadline=events_deadline)
+
+    pod: Optional[V1Pod] = _collect(pod_future, pod_deadline, "pod", errors)
+    fanout = time.monotonic()
+    logs_deadline = fanout + INSPECT_TIMEOUTS["logs"]
+    deployment_deadline = fanout + INSPECT_TIMEOUTS["deployment"]
+    log_futures: Dict[str, Future] = {}
+    deployment_future: Optional[Future] = None
+    if pod is not None:
+        for c in pod.spec.containers:
+            log_futures[c.name] = _submit(get_pod_log_tail, name, namespace, c.name, tail_lines, deadline=logs_deadline)
+        deployment_future = _submit(get_owner_deployment_events, pod, deployment_deadline)
+
+    logs: Dict[str, Optional[str]] = {}
+    for container, future in log_futures.items():
+        logs[container] = _collect(future, logs_deadline, f"logs.{container}", errors)
+
+    return {
+        "pod": format_pod_full(pod) if pod is not None else None,
+        "logs": logs,
+        "events": _collect(events_future, events_deadline, "events", errors),
+        "deployment": _collect(deployment_future, deployment_deadline, "deployment", errors)
+        if deployment_future is not None else None,
+        "errors": errors,
+    }
+
+# Transport metrics
+def get_transport_metrics() -> Dict[str, Any]:
+    return transport.metrics()
+
+# Cache metrics
+def get_cache_metrics() -> Dict[str, Any]:
+    return response_cache.stats()
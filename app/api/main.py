@@ -1,4 +1,5 @@
-from flask import Flask, jsonify, request, Response
+from flask import Flask, jsonify, request, Response, stream_with_context
+from typing import Any, Dict
 from k8s_client import (
     get_namespaces,
     get_deployments,
@@ -10,11 +11,22 @@ from k8s_client import (
     get_pod_logs,
     patch_pod,
     get_pod_full,
-    get_deployment_full
+    get_deployment_full,
+    inspect_pod,
+    INSPECT_LOG_TAIL_LINES,
+    get_transport_metrics,
+    get_cache_metrics,
+    iter_resource_pages,
+    cached_list,
+    response_cache
 )
+from export import EXPORT_MIMETYPES, ExportUnavailable, check_format, stream_export
+from admission import init_admission, get_admission_metrics, WORKERS
+from profiling import init_profiling, run_profile, run_tracemalloc, get_slow_requests, stage, DEBUG_PATH_PREFIX, MAX_PROFILE_SECONDS
 from flask_cors import CORS
 from logger import get_logger
 from flasgger import Swagger, swag_from
+from waitress import serve
 
 
 app = Flask(__name__)
@@ -85,8 +97,32 @@ swagger_template = {
     }
 }
 
-Swagger(app, template=swagger_template)
+# The debug endpoints are not advertised, their docs live in the README
+swagger_config = {
+    **Swagger.DEFAULT_CONFIG,
+    "specs": [{
+        **spec,
+        "rule_filter": lambda rule: not rule.rule.startswith(DEBUG_PATH_PREFIX),
+    } for spec in Swagger.DEFAULT_CONFIG["specs"]],
+}
+Swagger(app, template=swagger_template, config=swagger_config)
+init_profiling(app)
+init_admission(app)
+
+
+def export_response(kind: str, namespace: str, fmt: str) -> Response:
+    try:
+        check_format(fmt)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ExportUnavailable as e:
+        return jsonify({"error": str(e)}), 501
 
+    headers = {}
+    if fmt != "ndjson":
+        headers["Content-Disposition"] = f"attachment; filename={kind}s-{namespace}.{fmt}"
+    pages = iter_resource_pages(kind, namespace)
+    return Response(stream_with_context(stream_export(pages, kind, fmt)), mimetype=EXPORT_MIMETYPES[fmt], headers=headers)
 
 @app.before_request
 def log_request():
@@ -111,57 +147,140 @@ def health() -> Response:
     """
     return jsonify({"status": "ok"})
 
-@app.route("/api/graph", methods=["GET"])
-def get_graph() -> Response:
+@app.route("/api/metrics/transport", methods=["GET"])
+def transport_metrics() -> Response:
     """
-    Get resource graph for a namespace or for the whole cluster (if namespace=all)
+    Kubernetes API transport metrics
+    ---
+    tags:
+      - Utils
+    responses:
+      200:
+        description: Connection pool saturation, retry and circuit breaker counters
+        schema:
+          type: object
+          properties:
+            pool_size:
+              type: integer
+              example: 16
+            in_flight:
+              type: integer
+              example: 3
+            saturation:
+              type: number
+              example: 0.188
+            breaker_state:
+              type: string
+              example: closed
     """
-    namespace = request.args.get("namespace", "default")
+    return jsonify(get_transport_metrics())
 
-    try:
-        if namespace == "all":
-            deployments = get_all_deployments()
-            services = get_all_services()
-            pods = get_all_pods()
-        else:
-            deployments = get_deployments(namespace)
-            services = get_services(namespace)
-            pods = get_pods(namespace)
-    except Exception as e:
-        return jsonify({"error": f"Error fetching resources: {str(e)}"}), 500
+@app.route("/api/metrics/admission", methods=["GET"])
+def admission_metrics() -> Response:
+    """
+    Admission control metrics
+    ---
+    tags:
+      - Utils
+    responses:
+      200:
+        description: Per-lane concurrency, queue depth and rejection counters
+        schema:
+          type: object
+          properties:
+            shared_in_use:
+              type: integer
+              example: 5
+            shared_capacity:
+              type: integer
+              example: 12
+            rejections:
+              type: integer
+              example: 0
+            lanes:
+              type: object
+    """
+    return jsonify(get_admission_metrics())
+
+@app.route("/api/metrics/cache", methods=["GET"])
+def cache_metrics() -> Response:
+    """
+    Response cache metrics
+    ---
+    tags:
+      - Utils
+    responses:
+      200:
+        description: Cache backend, hit and miss counters
+        schema:
+          type: object
+          properties:
+            backend:
+              type: string
+              example: redis
+            hits:
+              type: integer
+              example: 120
+            misses:
+              type: integer
+              example: 14
+    """
+    return jsonify(get_cache_metrics())
+
+def build_graph(namespace: str) -> Dict[str, Any]:
+    # cached_list raises when a list is unavailable, so a graph built during an outage is never cached
+    deployments = cached_list("deployment", namespace)
+    services = cached_list("service", namespace)
+    pods = cached_list("pod", namespace)
 
     nodes = []
     edges = []
 
-    for pod in pods:
-        pod_id = f"{pod['namespace']}/{pod['name']}" if namespace == "all" else pod["name"]
-        nodes.append({"id": pod_id, "type": "Pod"})
+    with stage("graph"):
+        for pod in pods:
+            pod_id = f"{pod['namespace']}/{pod['name']}" if namespace == "all" else pod["name"]
+            nodes.append({"id": pod_id, "type": "Pod"})
 
-    for svc in services:
-        svc_id = f"{svc['namespace']}/{svc['name']}" if namespace == "all" else svc["name"]
-        svc_selector = svc.get("labels", {})
-        nodes.append({"id": svc_id, "type": "Service"})
+        for svc in services:
+            svc_id = f"{svc['namespace']}/{svc['name']}" if namespace == "all" else svc["name"]
+            svc_selector = svc.get("labels", {})
+            nodes.append({"id": svc_id, "type": "Service"})
 
-        for pod in pods:
-            if all(pod.get("labels", {}).get(k) == v for k, v in svc_selector.items()):
-                pod_id = f"{pod['namespace']}/{pod['name']}" if namespace == "all" else pod["name"]
-                edges.append({"from": svc_id, "to": pod_id, "relation": "routes_to"})
+            for pod in pods:
+                if all(pod.get("labels", {}).get(k) == v for k, v in svc_selector.items()):
+                    pod_id = f"{pod['namespace']}/{pod['name']}" if namespace == "all" else pod["name"]
+                    edges.append({"from": svc_id, "to": pod_id, "relation": "routes_to"})
 
-    for dep in deployments:
-        dep_id = f"{dep['namespace']}/{dep['name']}" if namespace == "all" else dep["name"]
-        dep_selector = dep.get("labels", {})
-        nodes.append({"id": dep_id, "type": "Deployment"})
+        for dep in deployments:
+            dep_id = f"{dep['namespace']}/{dep['name']}" if namespace == "all" else dep["name"]
+            dep_selector = dep.get("labels", {})
+            nodes.append({"id": dep_id, "type": "Deployment"})
 
-        for pod in pods:
-            if all(pod.get("labels", {}).get(k) == v for k, v in dep_selector.items()):
-                pod_id = f"{pod['namespace']}/{pod['name']}" if namespace == "all" else pod["name"]
-                edges.append({"from": dep_id, "to": pod_id, "relation": "creates"})
+            for pod in pods:
+                if all(pod.get("labels", {}).get(k) == v for k, v in dep_selector.items()):
+                    pod_id = f"{pod['namespace']}/{pod['name']}" if namespace == "all" else pod["name"]
+                    edges.append({"from": dep_id, "to": pod_id, "relation": "creates"})
 
-    return jsonify({
+    return {
         "namespace": namespace,
         "nodes": nodes,
         "edges": edges
-    })
+    }
+
+@app.route("/api/graph", methods=["GET"])
+def get_graph() -> Response:
+    """
+    Get resource graph for a namespace or for the whole cluster (if namespace=all)
+    """
+    namespace = request.args.get("namespace", "default")
+
+    try:
+        # Shares the time bucket of the lists it is built from, so a cached graph costs no upstream call
+        graph = response_cache.get_or_compute("graph", namespace, lambda: build_graph(namespace))
+    except Exception as e:
+        return jsonify({"error": f"Error fetching resources: {str(e)}"}), 500
+
+    return jsonify(graph)
 
 
 @app.route("/api/namespaces", methods=["GET"])
@@ -198,6 +317,12 @@ def deployments() -> Response:
         required: false
         default: all
         example: default
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [ndjson, arrow, parquet]
+        description: Stream the list page by page instead of returning a JSON array
     responses:
       200:
         description: List of deployments
@@ -207,6 +332,9 @@ def deployments() -> Response:
             $ref: '#/definitions/DeploymentModel'
     """
     namespace: str = request.args.get("namespace", "all")
+    fmt = request.args.get("format")
+    if fmt:
+        return export_response("deployment", namespace, fmt)
     if namespace == "all":
         return jsonify(get_all_deployments())
     return jsonify(get_deployments(namespace))
@@ -264,6 +392,12 @@ def pods() -> Response:
         required: false
         default: all
         example: default
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [ndjson, arrow, parquet]
+        description: Stream the list page by page instead of returning a JSON array
     responses:
       200:
         description: List of pods
@@ -273,6 +407,9 @@ def pods() -> Response:
             $ref: '#/definitions/PodModel'
     """
     namespace = request.args.get("namespace", "all")
+    fmt = request.args.get("format")
+    if fmt:
+        return export_response("pod", namespace, fmt)
     if namespace == "all":
         return jsonify(get_all_pods())
     return jsonify(get_pods(namespace))
@@ -317,6 +454,61 @@ def get_single_pod(namespace: str, name: str) -> Response:
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/pods/<namespace>/<name>/inspect", methods=["GET"])
+def inspect_single_pod(namespace: str, name: str) -> Response:
+    """
+    Get pod details, recent logs per container and related events in one call
+    ---
+    tags:
+      - Pods
+    parameters:
+      - name: namespace
+        in: path
+        type: string
+        required: true
+        example: default
+      - name: name
+        in: path
+        type: string
+        required: true
+        example: nginx-abc123
+      - name: tailLines
+        in: query
+        type: integer
+        required: false
+        default: 200
+        example: 200
+    responses:
+      200:
+        description: Pod inspection, sections that failed are null and listed in errors
+        examples:
+          inspection:
+            value:
+              pod:
+                apiVersion: v1
+                items: []
+              logs:
+                nginx: "Starting nginx...\n"
+              events:
+                - type: Normal
+                  reason: Pulled
+                  message: Container image "nginx:latest" already present on machine
+                  count: 1
+              deployment:
+                name: nginx
+                events: []
+              errors:
+                logs.sidecar: Timed out
+    """
+    tail_lines = request.args.get("tailLines", INSPECT_LOG_TAIL_LINES, type=int)
+    if not 0 < tail_lines <= 5000:
+        return jsonify({"error": "tailLines must be between 1 and 5000"}), 400
+
+    result = inspect_pod(namespace=namespace, name=name, tail_lines=tail_lines)
+    if result["pod"] is None:
+        return jsonify(result), 500
+    return jsonify(result)
+
 @app.route("/api/pods/metadata", methods=["PATCH"])
 def update_pod_metadata() -> Response:
     """
@@ -389,6 +581,12 @@ def services() -> Response:
         required: false
         default: all
         example: default
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [ndjson, arrow, parquet]
+        description: Stream the list page by page instead of returning a JSON array
     responses:
       200:
         description: List of services
@@ -398,6 +596,9 @@ def services() -> Response:
             $ref: '#/definitions/ServiceModel'
     """
     namespace: str = request.args.get("namespace", "all")
+    fmt = request.args.get("format")
+    if fmt:
+        return export_response("service", namespace, fmt)
     if namespace == "all":
         return jsonify(get_all_services())
     return jsonify(get_services(namespace))
@@ -444,5 +645,43 @@ def pod_logs() -> Response:
         logger.error(f"Error fetching logs for pod {pod_name} in namespace {namespace}: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/debug/profile", methods=["GET"])
+def debug_profile() -> Response:
+    """
+    Sample the stacks of all threads and return them in folded flamegraph format
+    """
+    seconds = request.args.get("seconds", 10, type=float)
+    interval = request.args.get("interval", 10, type=float)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 1 <= interval <= 1000:
+        return jsonify({"error": f"seconds must be in (0, {MAX_PROFILE_SECONDS}] and interval in [1, 1000]"}), 400
+
+    folded = run_profile(seconds, interval / 1000)
+    if folded is None:
+        return jsonify({"error": "Another profiling session is running"}), 409
+    return Response(folded, mimetype="text/plain")
+
+@app.route("/api/debug/tracemalloc", methods=["GET"])
+def debug_tracemalloc() -> Response:
+    """
+    Trace memory allocations for a while and return the largest allocation sites
+    """
+    seconds = request.args.get("seconds", 10, type=float)
+    limit = request.args.get("limit", 25, type=int)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0 < limit <= 200:
+        return jsonify({"error": f"seconds must be in (0, {MAX_PROFILE_SECONDS}] and limit in [1, 200]"}), 400
+
+    result = run_tracemalloc(seconds, limit)
+    if result is None:
+        return jsonify({"error": "Another profiling session is running"}), 409
+    return jsonify(result)
+
+@app.route("/api/debug/slow-requests", methods=["GET"])
+def debug_slow_requests() -> Response:
+    """
+    Slowest recent requests with a per-stage time breakdown
+    """
+    return jsonify(get_slow_requests())
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8080)
+    # A fixed thread pool, so API_WORKERS is the real concurrency the admission budget is planned against
+    serve(app, host="0.0.0.0", port=8080, threads=WORKERS)
@@ -0,0 +1,188 @@
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from flask import Flask, Response, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_BUFFER = int(os.getenv("SLOW_REQUEST_BUFFER", "50"))
+MAX_PROFILE_SECONDS = 60
+MAX_STACK_DEPTH = 128
+DEBUG_PATH_PREFIX = "/api/debug/"
+
+
+class RequestTrace:
+    def __init__(self, method: str, path: str, query: str):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.status = 500
+        self.stages: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        # Stages may be recorded from worker threads, e.g. by the pod inspection fan-out
+        with self._lock:
+            entry = self.stages.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def summary(self, duration: float) -> Dict[str, Any]:
+        with self._lock:
+            stages = {name: {"count": count, "ms": round(seconds * 1000, 2)} for name, (count, seconds) in self.stages.items()}
+        return {
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "status": self.status,
+            "startedAt": self.started_at.strftime("%Y-%m-%d %H:%M:%S UTC"),
+            "durationMs": round(duration * 1000, 2),
+            "stages": stages,
+        }
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+_slow_requests: Deque[Dict[str, Any]] = deque(maxlen=SLOW_REQUEST_BUFFER)
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        with stage("serialize"):
+            return super().dumps(obj, **kwargs)
+
+
+# Sampling profiler, output is in the folded format read by flamegraph.pl and speedscope
+def _frame_name(frame: Any) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _sample_stacks(seconds: float, interval: float) -> Counter:
+    samples: Counter = Counter()
+    own_thread = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            samples[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return samples
+
+def _snapshot_allocations(seconds: float, limit: int) -> Dict[str, Any]:
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(25)
+    try:
+        time.sleep(seconds)
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    top = []
+    for stat in snapshot.statistics("traceback")[:limit]:
+        top.append({
+            "sizeKb": round(stat.size / 1024, 1),
+            "count": stat.count,
+            "traceback": [f"{f.filename}:{f.lineno}" for f in stat.traceback],
+        })
+    return {"currentKb": round(current / 1024, 1), "peakKb": round(peak / 1024, 1), "top": top}
+
+# Only one profiling session runs at a time, returns None while another one is active
+def run_profile(seconds: float, interval: float) -> Optional[str]:
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        logger.info(f"Sampling stacks for {seconds}s every {interval * 1000:.0f}ms")
+        samples = _sample_stacks(seconds, interval)
+    finally:
+        _profile_lock.release()
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+def run_tracemalloc(seconds: float, limit: int) -> Optional[Dict[str, Any]]:
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        logger.info(f"Tracing allocations for {seconds}s")
+        return _snapshot_allocations(seconds, limit)
+    finally:
+        _profile_lock.release()
+
+def get_slow_requests() -> List[Dict[str, Any]]:
+    return sorted(list(_slow_requests), key=lambda r: r["durationMs"], reverse=True)
+
+
+def _authorized() -> bool:
+    token = request.headers.get("X-Debug-Token", "")
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        token = auth[len("Bearer "):]
+    return bool(DEBUG_TOKEN) and hmac.compare_digest(token.encode(), DEBUG_TOKEN.encode())
+
+def init_profiling(app: Flask) -> None:
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_trace():
+        _current_trace.set(RequestTrace(request.method, request.path, request.query_string.decode(errors="replace")))
+
+    @app.after_request
+    def keep_status(response: Response) -> Response:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_trace(exc):
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        _current_trace.set(None)
+        duration = time.perf_counter() - trace.started
+        # Profiling calls are slow by design and would push real requests out of the buffer
+        if duration * 1000 >= SLOW_REQUEST_MS and not trace.path.startswith(DEBUG_PATH_PREFIX):
+            _slow_requests.append(trace.summary(duration))
+
+    @app.before_request
+    def require_debug_token():
+        if request.path.startswith(DEBUG_PATH_PREFIX) and not _authorized():
+            # Do not advertise the debug surface to unauthenticated callers
+            return jsonify({"error": "Not found"}), 404
@@ -0,0 +1,17 @@
+import os
+import tempfile
+
+# k8s_client loads a kube config on import, point it at a cluster nothing listens on
+_KUBECONFIG = """
+apiVersion: v1
+kind: Config
+clusters: [{name: test, cluster: {server: "http://127.0.0.1:9"}}]
+users: [{name: test, user: {}}]
+contexts: [{name: test, context: {cluster: test, user: test}}]
+current-context: test
+"""
+
+if "KUBECONFIG" not in os.environ:
+    with tempfile.NamedTemporaryFile("w", suffix=".kubeconfig", delete=False) as f:
+        f.write(_KUBECONFIG)
+    os.environ["KUBECONFIG"] = f.name
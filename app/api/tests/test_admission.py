@@ -0,0 +1,154 @@
+import ipaddress
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+import admission
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    for rule, endpoint in [("/api/pods", "pods"), ("/api/graph", "get_graph"), ("/api/logs", "pod_logs"),
+                           ("/api/pods/metadata", "update_pod_metadata")]:
+        app.add_url_rule(rule, endpoint, lambda: "")
+    return app
+
+
+@pytest.mark.parametrize("url, lane", [
+    ("/api/pods", "pods:all"),
+    ("/api/pods?namespace=default", "pods"),
+    ("/api/graph", "get_graph"),
+    ("/api/graph?namespace=all", "get_graph:all"),
+    ("/api/logs?pod_name=web", "pod_logs"),
+    ("/api/logs?pod_name=web&namespace=all", "pod_logs"),
+    ("/api/pods/metadata", "update_pod_metadata"),
+    ("/api/pods?format=ndjson", "export:ndjson"),
+    ("/api/pods?namespace=default&format=parquet", "export:parquet"),
+    ("/api/pods?format=csv", "pods:all"),
+])
+def test_lane_selection(app, url, lane):
+    with app.test_request_context(url):
+        assert admission._lane_name() == lane
+
+
+def test_real_ip_ignored_from_untrusted_peer(app, monkeypatch):
+    monkeypatch.setattr(admission, "trusted_proxies", [ipaddress.ip_network("10.0.0.0/8")])
+    headers = {"X-Real-IP": "203.0.113.7", "X-Forwarded-For": "198.51.100.1"}
+
+    with app.test_request_context("/api/pods", headers=headers, environ_base={"REMOTE_ADDR": "192.0.2.10"}):
+        assert admission._client_key() == "192.0.2.10"
+    with app.test_request_context("/api/pods", headers=headers, environ_base={"REMOTE_ADDR": "10.1.2.3"}):
+        assert admission._client_key() == "203.0.113.7"
+
+
+def test_tracked_clients_stay_bounded(monkeypatch):
+    monkeypatch.setattr(admission, "MAX_TRACKED_CLIENTS", 10)
+    controller = admission.AdmissionController()
+    for i in range(50):
+        controller._rate_limit(f"client-{i}")
+    assert len(controller.buckets) <= 10
+    assert "client-49" in controller.buckets
+
+
+def test_lane_rejects_when_queue_is_full():
+    lane = admission.Lane("pods:all", max_concurrent=1, max_queue=0, max_wait=5)
+    lane.acquire()
+    with pytest.raises(admission.Rejected, match="queue is full"):
+        lane.acquire()
+
+
+def test_lane_rejects_when_predicted_wait_is_too_long():
+    lane = admission.Lane("get_graph:all", max_concurrent=1, max_queue=4, max_wait=5)
+    lane.avg_service_time = 6
+    lane.acquire()
+    with pytest.raises(admission.Rejected, match="would exceed") as e:
+        lane.acquire()
+    assert e.value.retry_after == 6
+    assert lane.queued == 0
+
+
+def test_lane_gives_up_at_the_wait_deadline():
+    lane = admission.Lane("pods", max_concurrent=1, max_queue=4, max_wait=0.05)
+    lane.avg_service_time = 0.01
+    lane.acquire()
+    with pytest.raises(admission.Rejected, match="exceeded"):
+        lane.acquire()
+    assert lane.queued == 0
+    assert lane.active == 1
+
+
+def test_queued_request_gets_the_released_slot():
+    lane = admission.Lane("pods", max_concurrent=1, max_queue=4, max_wait=5)
+    lane.avg_service_time = 0.01
+    lane.acquire()
+    waiter = threading.Thread(target=lane.acquire)
+    waiter.start()
+    while lane.queued == 0:
+        time.sleep(0.001)
+    lane.release(0.01)
+    waiter.join(timeout=5)
+    assert lane.active == 1
+    assert lane.queued == 0
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setattr(admission, "RATE_LIMIT_RPS", 1000)
+    monkeypatch.setattr(admission, "RATE_LIMIT_BURST", 1000)
+    controller = admission.AdmissionController()
+    controller.shared_capacity = 1
+    monkeypatch.setattr(admission, "controller", controller)
+    return controller
+
+
+def test_reserved_endpoints_skip_the_shared_budget(controller):
+    lane = controller.admit("pods", "pods", "client")
+    assert controller.shared_in_use == 1
+    assert controller.admit("health", "health", "client") is None
+    assert controller.admit("get_single_pod", "get_single_pod", "client") is None
+    with pytest.raises(admission.Rejected, match="no shared workers"):
+        controller.admit("services", "services", "client")
+
+    controller.release(lane, 0.1)
+    assert controller.shared_in_use == 0
+
+
+def test_rejected_request_returns_429_with_retry_after(app, controller):
+    admission.init_admission(app)
+    controller.shared_in_use = controller.shared_capacity
+    controller._lane("pods:all").avg_service_time = 2.4
+
+    response = app.test_client().get("/api/pods")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+    assert response.get_json()["reason"] == "no shared workers available"
+    assert controller.rejections == 1
+
+
+def test_teardown_returns_the_shared_slot(app, controller):
+    admission.init_admission(app)
+    client = app.test_client()
+    for _ in range(3):
+        assert client.get("/api/pods").status_code == 200
+        assert controller.shared_in_use == 0
+    assert controller.lanes["pods:all"].active == 0
+
+
+def test_exports_do_not_slow_down_interactive_lanes(controller):
+    controller.shared_capacity = 4
+    controller._lane("export:ndjson").avg_service_time = 60
+    exports = [controller.admit("pods", "export:ndjson", "client") for _ in range(2)]
+    with pytest.raises(admission.Rejected, match="export:ndjson queue wait would exceed"):
+        controller.admit("pods", "export:ndjson", "client")
+
+    pods = controller.admit("pods", "pods:all", "client")
+    assert pods is not None
+    for export in exports:
+        controller.release(export, 60)
+    controller.release(pods, 0.5)
+
+    assert controller.lanes["export:ndjson"].avg_service_time > 10
+    assert controller.lanes["pods:all"].avg_service_time == 0.5
@@ -0,0 +1,224 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+from flask import Flask, jsonify
+
+import cache
+from cache import FakeRedis, LocalLRUCache, RedisCache, ResponseCache
+
+
+class Counter:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"wall": 1_000_000.0, "monotonic": 100.0}
+    monkeypatch.setattr(cache.time, "time", lambda: now["wall"])
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now["monotonic"])
+    return now
+
+
+def test_redis_backed_cache_hits_and_misses(clock):
+    compute = Counter([{"name": "web"}])
+    responses = ResponseCache(RedisCache(FakeRedis()), ttl=15)
+
+    assert responses.get_or_compute("pod", "default", compute) == [{"name": "web"}]
+    assert responses.get_or_compute("pod", "default", compute) == [{"name": "web"}]
+    assert responses.get_or_compute("pod", "kube-system", compute) == [{"name": "web"}]
+    assert compute.calls == 2
+    assert responses.stats()["hits"] == 1
+    assert responses.stats()["misses"] == 2
+
+
+def test_replicas_share_results_through_redis(clock):
+    server = FakeRedis()
+    compute = Counter({"nodes": []})
+    ResponseCache(RedisCache(server), ttl=15).get_or_compute("graph", "all", compute)
+    ResponseCache(RedisCache(server), ttl=15).get_or_compute("graph", "all", compute)
+    assert compute.calls == 1
+
+
+def test_entries_roll_over_with_the_time_bucket(clock):
+    compute = Counter([])
+    responses = ResponseCache(LocalLRUCache(), ttl=15)
+    clock["wall"] = 1_000_010.0
+
+    responses.get_or_compute("pod", "default", compute)
+    clock["wall"] += 9
+    responses.get_or_compute("pod", "default", compute)
+    assert compute.calls == 1
+
+    clock["wall"] += 1
+    responses.get_or_compute("pod", "default", compute)
+    assert compute.calls == 2
+
+
+def test_zero_ttl_disables_caching(clock):
+    compute = Counter([])
+    responses = ResponseCache(LocalLRUCache(), ttl=0)
+    responses.get_or_compute("pod", "default", compute)
+    responses.get_or_compute("pod", "default", compute)
+    assert compute.calls == 2
+
+
+def test_local_cache_evicts_least_recently_used_by_size():
+    backend = LocalLRUCache(max_bytes=10)
+    backend.set("a", b"aaaa", 60)
+    backend.set("b", b"bbbb", 60)
+    assert backend.get("a") == b"aaaa"
+
+    backend.set("c", b"cccc", 60)
+    assert backend.get("b") is None
+    assert backend.get("a") == b"aaaa"
+    assert backend.stats()["bytes"] == 8
+    assert backend.stats()["evictions"] == 1
+
+    backend.set("huge", b"x" * 11, 60)
+    assert backend.get("huge") is None
+    assert backend.stats()["entries"] == 2
+
+
+def test_local_cache_expires_entries(clock):
+    backend = LocalLRUCache()
+    backend.set("a", b"value", 5)
+    clock["monotonic"] += 4.9
+    assert backend.get("a") == b"value"
+    clock["monotonic"] += 0.1
+    assert backend.get("a") is None
+    assert backend.stats()["bytes"] == 0
+
+
+def test_cached_response_matches_fresh_response(clock):
+    app = Flask(__name__)
+    value = {
+        "name": "web",
+        "metadata": {"creation_timestamp": datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc), "labels": {"app": "web"}},
+        "ports": ["80:8080/TCP"],
+    }
+    responses = ResponseCache(RedisCache(FakeRedis()), ttl=15)
+
+    with app.app_context():
+        fresh = jsonify(responses.get_or_compute("pod", "default", lambda: value)).get_data()
+        cached = jsonify(responses.get_or_compute("pod", "default", lambda: value)).get_data()
+    assert responses.stats()["hits"] == 1
+    assert cached == fresh
+
+
+def test_fake_redis_drops_keys_of_past_buckets(clock):
+    server = FakeRedis()
+    responses = ResponseCache(RedisCache(server), ttl=15)
+    for _ in range(200):
+        responses.get_or_compute("pod", "default", lambda: [])
+        clock["wall"] += 15
+        clock["monotonic"] += 15
+    assert server.dbsize() <= 2
+
+
+class SlowCompute(Counter):
+    def __init__(self, value, started=None, release=None):
+        super().__init__(value)
+        self.started = started or threading.Event()
+        self.release = release or threading.Event()
+
+    def __call__(self):
+        self.started.set()
+        self.release.wait(5)
+        return super().__call__()
+
+
+@pytest.fixture
+def wall(monkeypatch):
+    # Only the wall clock is frozen, fill waits still need time.monotonic to advance
+    now = {"wall": 1_000_010.0}
+    monkeypatch.setattr(cache.time, "time", lambda: now["wall"])
+    return now
+
+
+def in_thread(fn, *args):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", fn(*args)))
+    thread.start()
+    return thread, result
+
+
+def test_concurrent_misses_compute_once(wall):
+    responses = ResponseCache(LocalLRUCache(), ttl=15)
+    compute = SlowCompute(["pods"])
+    threads = [in_thread(responses.get_or_compute, "pod", "all", compute) for _ in range(8)]
+    compute.started.wait(5)
+    time.sleep(0.05)
+    compute.release.set()
+    for thread, result in threads:
+        thread.join(5)
+        assert result["value"] == ["pods"]
+
+    assert compute.calls == 1
+    assert responses.stats()["misses"] == 1
+    assert 1 <= responses.stats()["fill_waits"] <= 7
+
+
+def test_previous_bucket_is_served_while_the_next_one_fills(wall):
+    responses = ResponseCache(LocalLRUCache(), ttl=15)
+    responses.get_or_compute("pod", "all", lambda: ["old"])
+    wall["wall"] += 15
+
+    compute = SlowCompute(["new"])
+    filler, result = in_thread(responses.get_or_compute, "pod", "all", compute)
+    compute.started.wait(5)
+    assert responses.get_or_compute("pod", "all", Counter(["unexpected"])) == ["old"]
+    compute.release.set()
+    filler.join(5)
+
+    assert result["value"] == ["new"]
+    assert responses.get_or_compute("pod", "all", Counter(["unexpected"])) == ["new"]
+    assert responses.stats()["previous_hits"] == 1
+
+
+def test_replicas_wait_for_the_fill_lock_holder(wall):
+    server = FakeRedis()
+    filling = ResponseCache(RedisCache(server), ttl=15)
+    waiting = ResponseCache(RedisCache(server), ttl=15)
+
+    compute = SlowCompute({"nodes": ["web"]})
+    filler, _ = in_thread(filling.get_or_compute, "graph", "all", compute)
+    compute.started.wait(5)
+    other = Counter({"nodes": []})
+    waiter, result = in_thread(waiting.get_or_compute, "graph", "all", other)
+    time.sleep(0.1)
+    compute.release.set()
+    filler.join(5)
+    waiter.join(5)
+
+    assert result["value"] == {"nodes": ["web"]}
+    assert other.calls == 0
+    assert waiting.stats()["fill_waits"] == 1
+    assert server.get("pandak8s:graph:all:66667:fill") is None
+
+
+def test_replicas_serve_the_previous_bucket_while_another_fills(wall):
+    server = FakeRedis()
+    replica = ResponseCache(RedisCache(server), ttl=15)
+    replica.get_or_compute("pod", "all", lambda: ["old"])
+    wall["wall"] += 15
+    server.set("pandak8s:pod:all:66668:fill", b"1", ex=30, nx=True)
+
+    assert ResponseCache(RedisCache(server), ttl=15).get_or_compute("pod", "all", Counter(["new"])) == ["old"]
+
+
+def test_abandoned_fill_lock_only_delays_the_compute(wall, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_FILL_WAIT_SECONDS", 0.1)
+    server = FakeRedis()
+    server.set("pandak8s:pod:all:66667:fill", b"1", ex=30, nx=True)
+    compute = Counter(["pods"])
+
+    assert ResponseCache(RedisCache(server), ttl=15).get_or_compute("pod", "all", compute) == ["pods"]
+    assert compute.calls == 1
@@ -0,0 +1,106 @@
+import io
+import json
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+import export
+import main
+
+PAGES = [
+    [{"name": "web-1", "namespace": "default", "labels": {"app": "web"}, "restartCount": "0"},
+     {"name": "web-2", "namespace": "default", "labels": {"app": "web"}, "restartCount": "2"}],
+    [{"name": "db-1", "namespace": "data", "labels": {}, "restartCount": "1"}],
+]
+
+
+def failing_pages():
+    yield PAGES[0]
+    raise RuntimeError("API server went away")
+
+
+def test_ndjson_writes_one_line_per_object():
+    created = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+    pages = [[{"name": "web-1", "metadata": {"creation_timestamp": created}}], PAGES[1]]
+    lines = "".join(export.stream_ndjson(pages)).splitlines()
+
+    assert [json.loads(line)["name"] for line in lines] == ["web-1", "db-1"]
+    assert json.loads(lines[0])["metadata"]["creation_timestamp"] == "Sat, 01 Jun 2024 12:00:00 GMT"
+
+
+def test_ndjson_ends_with_an_error_record_after_a_failure():
+    lines = "".join(export.stream_ndjson(failing_pages())).splitlines()
+    assert len(lines) == 3
+    assert json.loads(lines[-1]) == {"error": "API server went away"}
+
+
+def test_arrow_writes_one_batch_per_page():
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+
+    data = b"".join(export.stream_arrow(iter(PAGES), "pod"))
+    reader = pyarrow.ipc.open_stream(pa.BufferReader(data))
+    batches = list(reader)
+
+    assert [batch.num_rows for batch in batches] == [2, 1]
+    assert reader.schema.names == export.COLUMNS["pod"]
+    table = pa.Table.from_batches(batches)
+    assert table.column("name").to_pylist() == ["web-1", "web-2", "db-1"]
+    assert table.column("labels").to_pylist() == ['{"app":"web"}', '{"app":"web"}', "{}"]
+    assert table.column("node").to_pylist() == [None, None, None]
+
+
+def test_arrow_stream_without_end_marker_after_a_failure():
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+
+    chunks = []
+    with pytest.raises(RuntimeError):
+        for chunk in export.stream_arrow(failing_pages(), "pod"):
+            chunks.append(chunk)
+    reader = pyarrow.ipc.open_stream(pa.BufferReader(b"".join(chunks)))
+    assert reader.read_next_batch().num_rows == 2
+    with pytest.raises(Exception):
+        reader.read_next_batch()
+
+
+def test_parquet_writes_one_row_group_per_page():
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    data = b"".join(export.stream_parquet(iter(PAGES), "pod"))
+    parquet_file = pq.ParquetFile(io.BytesIO(data))
+
+    assert parquet_file.num_row_groups == 2
+    assert [parquet_file.metadata.row_group(i).num_rows for i in range(2)] == [2, 1]
+    table = pq.read_table(io.BytesIO(data))
+    assert table.column("labels").to_pylist() == ['{"app":"web"}', '{"app":"web"}', "{}"]
+    assert table.column("restartCount").to_pylist() == ["0", "2", "1"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "iter_resource_pages", lambda kind, namespace: iter(PAGES))
+    return main.app.test_client()
+
+
+def test_ndjson_endpoint_streams_every_page(client):
+    response = client.get("/api/pods?format=ndjson")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert len(response.get_data(as_text=True).splitlines()) == 3
+
+
+def test_unknown_format_is_rejected(client):
+    response = client.get("/api/pods?format=csv")
+    assert response.status_code == 400
+    assert "Unsupported format csv" in response.get_json()["error"]
+
+
+def test_columnar_formats_need_pyarrow(client, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    response = client.get("/api/services?namespace=default&format=parquet")
+    assert response.status_code == 501
+    assert "pyarrow" in response.get_json()["error"]
+    assert client.get("/api/services?format=ndjson").status_code == 200
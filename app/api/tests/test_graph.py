@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+from kubernetes.client import V1ObjectMeta, V1Service, V1ServiceSpec
+from urllib3.exceptions import MaxRetryError
+
+import k8s_client
+import main
+from cache import LocalLRUCache, ResponseCache
+from transport import Transport
+
+
+def service(name, labels):
+    return V1Service(metadata=V1ObjectMeta(name=name, namespace="default", labels=labels), spec=V1ServiceSpec(type="ClusterIP"))
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    state = {"down": False}
+    transport = Transport(pool_size=1)
+
+    def call(call_type, fn, *args, **kwargs):
+        if state["down"]:
+            raise MaxRetryError(None, "/api/v1/services", "Connection refused")
+        if "service" in fn.__name__:
+            return SimpleNamespace(items=[service("web", {"app": "web"})])
+        return SimpleNamespace(items=[])
+
+    monkeypatch.setattr(transport, "call", call)
+    monkeypatch.setattr(k8s_client, "transport", transport)
+    cache = ResponseCache(LocalLRUCache(), ttl=15)
+    monkeypatch.setattr(k8s_client, "response_cache", cache)
+    monkeypatch.setattr(main, "response_cache", cache)
+    return state
+
+
+def test_graph_built_during_an_outage_is_not_cached(upstream):
+    upstream["down"] = True
+    client = main.app.test_client()
+
+    response = client.get("/api/graph?namespace=all")
+    assert response.status_code == 500
+    assert main.response_cache.stats()["entries"] == 0
+
+    upstream["down"] = False
+    graph = client.get("/api/graph?namespace=all").get_json()
+    assert graph["nodes"] == [{"id": "default/web", "type": "Service"}]
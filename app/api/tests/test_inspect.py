@@ -0,0 +1,128 @@
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from kubernetes.client import V1Container, V1ObjectMeta, V1OwnerReference, V1Pod, V1PodSpec, V1ReplicaSet
+from kubernetes.client.exceptions import ApiException
+
+import k8s_client
+import main
+
+CREATED = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def owner(kind, name):
+    return V1OwnerReference(api_version="apps/v1", kind=kind, name=name, uid=f"{name}-uid")
+
+
+def make_pod():
+    return V1Pod(
+        metadata=V1ObjectMeta(name="web-abc-123", namespace="default", uid="pod-uid", creation_timestamp=CREATED,
+                              owner_references=[owner("ReplicaSet", "web-abc")]),
+        spec=V1PodSpec(containers=[V1Container(name="web", image="nginx"), V1Container(name="sidecar", image="envoy")]),
+    )
+
+
+def make_event(reason):
+    return SimpleNamespace(type="Normal", reason=reason, message="", count=1, first_timestamp=CREATED,
+                           last_timestamp=CREATED, event_time=None, source=None)
+
+
+class FakeApi:
+    def __init__(self):
+        self.pod_error = None
+        self.failing_logs = {}
+        self.slow_logs = set()
+        self.calls = []
+
+    def call(self, call_type, fn, *args, max_retries=None, **kwargs):
+        name = fn.__name__
+        self.calls.append((name, kwargs, max_retries))
+        if name == "read_namespaced_pod":
+            if self.pod_error:
+                raise self.pod_error
+            return make_pod()
+        if name == "read_namespaced_pod_log":
+            container = kwargs["container"]
+            if container in self.slow_logs:
+                time.sleep(0.3)
+            if container in self.failing_logs:
+                raise self.failing_logs[container]
+            return f"{container} log\n"
+        if name == "read_namespaced_replica_set":
+            return V1ReplicaSet(metadata=V1ObjectMeta(name=kwargs["name"], owner_references=[owner("Deployment", "web")]))
+        if name == "list_namespaced_event":
+            return SimpleNamespace(items=[make_event(kwargs["field_selector"].split(",")[0].split("=")[1])])
+        raise AssertionError(f"unexpected call {name}")
+
+
+@pytest.fixture
+def api(monkeypatch):
+    fake = FakeApi()
+    monkeypatch.setattr(k8s_client.transport, "call", fake.call)
+    return fake
+
+
+def inspect(**params):
+    return main.app.test_client().get("/api/pods/default/web-abc-123/inspect", query_string=params)
+
+
+def test_inspect_returns_every_section(api):
+    response = inspect(tailLines=50)
+    assert response.status_code == 200
+    body = response.get_json()
+
+    assert body["pod"]["items"][0]["metadata"]["name"] == "web-abc-123"
+    assert body["logs"] == {"web": "web log\n", "sidecar": "sidecar log\n"}
+    assert [e["reason"] for e in body["events"]] == ["Pod"]
+    assert body["errors"] == {}
+    log_calls = [kwargs for name, kwargs, _ in api.calls if name == "read_namespaced_pod_log"]
+    assert {kwargs["tail_lines"] for kwargs in log_calls} == {50}
+
+
+def test_owner_deployment_is_found_through_the_replica_set(api):
+    body = inspect().get_json()
+    assert body["deployment"]["name"] == "web"
+    assert [e["reason"] for e in body["deployment"]["events"]] == ["Deployment"]
+    assert any(name == "read_namespaced_replica_set" and kwargs["name"] == "web-abc" for name, kwargs, _ in api.calls)
+
+
+def test_failed_sections_are_reported_in_errors(api):
+    api.failing_logs["sidecar"] = ApiException(status=400, reason="container is waiting to start")
+    response = inspect()
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["logs"] == {"web": "web log\n", "sidecar": None}
+    assert "container is waiting to start" in body["errors"]["logs.sidecar"]
+    assert body["deployment"]["name"] == "web"
+
+
+def test_slow_section_times_out_with_a_bounded_upstream_call(api, monkeypatch):
+    monkeypatch.setitem(k8s_client.INSPECT_TIMEOUTS, "logs", 0.05)
+    api.slow_logs.add("web")
+    body = inspect().get_json()
+
+    assert body["errors"] == {"logs.web": "Timed out"}
+    assert body["logs"]["sidecar"] == "sidecar log\n"
+    for name, kwargs, max_retries in api.calls:
+        assert max_retries == 0
+        if name == "read_namespaced_pod_log":
+            assert kwargs["_request_timeout"][1] <= 0.05
+
+
+def test_only_a_failed_pod_read_is_a_server_error(api):
+    api.pod_error = ApiException(status=404, reason="Not Found")
+    response = inspect()
+    assert response.status_code == 500
+    body = response.get_json()
+    assert body["pod"] is None
+    assert body["logs"] == {}
+    assert body["deployment"] is None
+    assert "Not Found" in body["errors"]["pod"]
+    assert [e["reason"] for e in body["events"]] == ["Pod"]
+
+
+def test_invalid_tail_lines_is_rejected(api):
+    assert inspect(tailLines=0).status_code == 400
+    assert api.calls == []
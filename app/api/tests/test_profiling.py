@@ -0,0 +1,39 @@
+from flask import Flask
+
+import profiling
+
+
+def make_app(monkeypatch):
+    monkeypatch.setattr(profiling, "SLOW_REQUEST_MS", 0)
+    monkeypatch.setattr(profiling, "DEBUG_TOKEN", "secret")
+    monkeypatch.setattr(profiling, "_slow_requests", profiling.deque(maxlen=10))
+    app = Flask(__name__)
+    profiling.init_profiling(app)
+
+    @app.route("/api/graph")
+    def graph():
+        with profiling.stage("graph"):
+            return {"nodes": []}
+
+    @app.route("/api/debug/slow-requests")
+    def slow_requests():
+        return {"requests": profiling.get_slow_requests()}
+
+    return app
+
+
+def test_slow_requests_record_stages(monkeypatch):
+    client = make_app(monkeypatch).test_client()
+    client.get("/api/graph?namespace=all")
+
+    [trace] = profiling.get_slow_requests()
+    assert trace["path"] == "/api/graph"
+    assert trace["status"] == 200
+    assert set(trace["stages"]) == {"graph", "serialize"}
+
+
+def test_debug_requests_are_not_recorded(monkeypatch):
+    client = make_app(monkeypatch).test_client()
+    assert client.get("/api/debug/slow-requests").status_code == 404
+    assert client.get("/api/debug/slow-requests", headers={"X-Debug-Token": "secret"}).status_code == 200
+    assert profiling.get_slow_requests() == []
@@ -0,0 +1,178 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+from kubernetes.client.exceptions import ApiException
+from urllib3.exceptions import ReadTimeoutError
+
+import transport
+from transport import CircuitBreaker, CircuitOpenError, StaleStore, Transport
+
+
+def list_pods():
+    return "pods"
+
+
+def test_breaker_opens_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_unexpected_probe_error_does_not_wedge_breaker():
+    t = Transport(pool_size=1)
+    t.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    t.breaker.record_failure()
+
+    def broken_probe(**kwargs):
+        raise ValueError("cannot deserialize")
+
+    with pytest.raises(ValueError):
+        t.call("list", broken_probe)
+    assert t.breaker.state == CircuitBreaker.OPEN
+
+    assert t.call("list", lambda **kwargs: "pods") == "pods"
+    assert t.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_breaker_fails_fast():
+    t = Transport(pool_size=1)
+    t.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    t.breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        t.call("list", list_pods)
+    assert t.metrics()["rejected"] == 1
+
+
+def test_stale_store_expires_by_age(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(transport.time, "monotonic", lambda: now[0])
+    store = StaleStore(max_age=10, max_items=100)
+    store.put("pods:default", [1, 2])
+
+    now[0] += 5
+    assert store.get("pods:default") == [1, 2]
+    assert store.stats()["stale_oldest_age"] == 5
+
+    now[0] += 10
+    assert store.get("pods:default") is None
+    assert store.stats()["stale_entries"] == 0
+
+
+def test_stale_store_evicts_oldest_beyond_item_limit():
+    store = StaleStore(max_age=60, max_items=5)
+    store.put("a", [1, 2, 3])
+    store.put("b", [1, 2])
+    store.put("c", [1])
+    assert store.get("a") is None
+    assert store.get("b") == [1, 2]
+    assert store.stats()["stale_items"] == 3
+
+    store.put("huge", list(range(6)))
+    assert store.get("huge") is None
+
+
+class Flaky:
+    def __init__(self, *errors, result="pods"):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = 0
+        self.__name__ = "list_namespaced_pod"
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+def api_error(status, retry_after=None):
+    e = ApiException(status=status, reason="error")
+    e.headers = {"Retry-After": retry_after} if retry_after is not None else {}
+    return e
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(transport.time, "sleep", delays.append)
+    return delays
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retryable_statuses_are_retried(sleeps, status):
+    t = Transport(pool_size=1)
+    fn = Flaky(api_error(status), api_error(status))
+    assert t.call("list", fn) == "pods"
+    assert fn.calls == 3
+    assert len(sleeps) == 2
+    assert t.metrics()["retries"] == 2
+    assert t.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retry_after_seconds_sets_delay_and_is_capped(sleeps):
+    t = Transport(pool_size=1)
+    t.call("list", Flaky(api_error(429, "2"), api_error(429, "3600")))
+    assert sleeps == [2.0, transport.BACKOFF_MAX]
+
+
+def test_retry_after_http_date_sets_delay(sleeps, monkeypatch):
+    monkeypatch.setattr(transport.time, "time", lambda: 1_700_000_000.0)
+    retry_at = format_datetime(datetime.fromtimestamp(1_700_000_003, timezone.utc), usegmt=True)
+    Transport(pool_size=1).call("list", Flaky(api_error(503, retry_at)))
+    assert sleeps == [3.0]
+
+
+def test_non_retryable_api_errors_are_not_retried(sleeps):
+    t = Transport(pool_size=1)
+    fn = Flaky(api_error(404))
+    with pytest.raises(ApiException):
+        t.call("list", fn)
+    assert fn.calls == 1
+    assert sleeps == []
+    assert t.breaker.failures == 0
+
+
+def test_read_timeouts_are_not_retried(sleeps):
+    t = Transport(pool_size=1)
+    fn = Flaky(ReadTimeoutError(None, "/api/v1/pods", "Read timed out."))
+    with pytest.raises(ReadTimeoutError):
+        t.call("list", fn)
+    assert fn.calls == 1
+    assert sleeps == []
+    assert t.breaker.failures == 1
+
+
+def test_failed_attempts_open_the_breaker_and_stop_retrying(sleeps):
+    t = Transport(pool_size=1)
+    t.breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    fn = Flaky(*[api_error(503) for _ in range(4)])
+    with pytest.raises(ApiException):
+        t.call("list", fn)
+    assert fn.calls == 2
+    assert t.breaker.state == CircuitBreaker.OPEN
+
+
+def test_open_circuit_serves_stale_lists(monkeypatch):
+    import k8s_client
+
+    t = Transport(pool_size=1)
+    t.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    t.breaker.record_failure()
+    monkeypatch.setattr(k8s_client, "transport", t)
+    pods = [{"name": "web"}]
+    t.stale.put("pods:default", pods)
+
+    assert k8s_client._list_formatted("pod", "default") == pods
+    assert t.metrics()["rejected"] == 1
+    assert t.metrics()["stale_served"] == 1
+    with pytest.raises(CircuitOpenError):
+        k8s_client._list_formatted("pod", "kube-system")
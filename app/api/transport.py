@@ -0,0 +1,258 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from kubernetes import client
+from kubernetes.client.exceptions import ApiException
+from urllib3.exceptions import HTTPError, ReadTimeoutError
+from logger import get_logger
+from profiling import stage
+
+logger = get_logger(__name__)
+
+# Pool size should match the number of threads that can talk to the API server at once,
+# the request workers plus the pod inspection fan-out
+POOL_SIZE = int(os.getenv("K8S_POOL_SIZE", str(int(os.getenv("API_WORKERS", "16")) + int(os.getenv("INSPECT_WORKERS", "8")))))
+
+# (connect, read) timeouts in seconds per call type
+TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    "list": (float(os.getenv("K8S_CONNECT_TIMEOUT", "3")), float(os.getenv("K8S_LIST_READ_TIMEOUT", "20"))),
+    "detail": (float(os.getenv("K8S_CONNECT_TIMEOUT", "3")), float(os.getenv("K8S_DETAIL_READ_TIMEOUT", "5"))),
+    "logs": (float(os.getenv("K8S_CONNECT_TIMEOUT", "3")), float(os.getenv("K8S_LOGS_READ_TIMEOUT", "15"))),
+    "write": (float(os.getenv("K8S_CONNECT_TIMEOUT", "3")), float(os.getenv("K8S_WRITE_READ_TIMEOUT", "10"))),
+}
+
+MAX_RETRIES = int(os.getenv("K8S_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("K8S_BACKOFF_BASE", "0.2"))
+BACKOFF_MAX = float(os.getenv("K8S_BACKOFF_MAX", "5"))
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("K8S_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("K8S_BREAKER_RESET_SECONDS", "30"))
+# Formatted lists kept to answer while the API server is unavailable
+STALE_MAX_AGE_SECONDS = float(os.getenv("K8S_STALE_MAX_AGE_SECONDS", "300"))
+STALE_MAX_ITEMS = int(os.getenv("K8S_STALE_MAX_ITEMS", "20000"))
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                # Let a single probe through to test whether the API server recovered
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Kubernetes API recovered, closing circuit breaker.")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Kubernetes API unhealthy after {self.failures} failures, opening circuit breaker.")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+# Last good formatted list per key, bounded by age and by the total number of items held
+class StaleStore:
+    def __init__(self, max_age: float = STALE_MAX_AGE_SECONDS, max_items: int = STALE_MAX_ITEMS):
+        self.max_age = max_age
+        self.max_items = max_items
+        self.items = 0
+        self.served = 0
+        self._entries: "OrderedDict[str, Tuple[List[Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key: str, value: List[Any]) -> None:
+        if len(value) > self.max_items:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic())
+            self.items += len(value)
+            while self.items > self.max_items:
+                self._remove(next(iter(self._entries)))
+
+    def get(self, key: str) -> Optional[List[Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored = entry
+            age = time.monotonic() - stored
+            if age > self.max_age:
+                self._remove(key)
+                return None
+            self.served += 1
+        logger.warning(f"Serving stale {key} from {age:.0f}s ago")
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            oldest = min((stored for _, stored in self._entries.values()), default=None)
+            return {
+                "stale_entries": len(self._entries),
+                "stale_items": self.items,
+                "stale_served": self.served,
+                "stale_oldest_age": round(time.monotonic() - oldest, 1) if oldest is not None else None,
+            }
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self.items -= len(value)
+
+
+class Transport:
+    def __init__(self, pool_size: int = POOL_SIZE):
+        configuration = client.Configuration.get_default_copy()
+        configuration.connection_pool_maxsize = pool_size
+        # Retries are handled here so they can honour Retry-After and feed the breaker
+        configuration.retries = False
+        self.api_client = client.ApiClient(configuration)
+        self.pool_size = pool_size
+        self.breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+        self.stale = StaleStore()
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "rejected": 0,
+            "peak_in_flight": 0,
+            "saturated_calls": 0,
+        }
+
+    def call(self, call_type: str, fn: Callable[..., Any], *args: Any, max_retries: int = MAX_RETRIES, **kwargs: Any) -> Any:
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError(f"Kubernetes API circuit is open, refusing {fn.__name__}")
+
+        kwargs.setdefault("_request_timeout", TIMEOUTS[call_type])
+        attempt = 0
+        while True:
+            self._enter()
+            try:
+                with stage(f"k8s.{fn.__name__}"):
+                    result = fn(*args, **kwargs)
+            except ApiException as e:
+                if e.status not in RETRYABLE_STATUSES:
+                    # The API server answered, so it is healthy even if the request was rejected
+                    self.breaker.record_success()
+                    raise
+                error, retry_after = e, _retry_after(e)
+            except ReadTimeoutError:
+                # A hung API server would hold the worker for another full read timeout per retry
+                self.breaker.record_failure()
+                self._count("failures")
+                logger.error(f"{fn.__name__} timed out after {kwargs['_request_timeout']}, not retrying")
+                raise
+            except HTTPError as e:
+                error, retry_after = e, None
+            except Exception:
+                # Anything unexpected still has to settle the breaker, or a half-open probe never finishes
+                self.breaker.record_failure()
+                self._count("failures")
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self._leave()
+
+            # Every failed attempt counts, so the breaker opens while retries are still running
+            self.breaker.record_failure()
+            attempt += 1
+            if attempt > max_retries or not self.breaker.allow():
+                self._count("failures")
+                logger.error(f"{fn.__name__} failed after {attempt} attempts: {error}")
+                raise error
+
+            delay = retry_after if retry_after is not None else _backoff(attempt)
+            self._count("retries")
+            logger.warning(f"{fn.__name__} failed ({error.__class__.__name__}), retrying in {delay:.2f}s "
+                           f"(attempt {attempt}/{max_retries})")
+            with stage("k8s.retry_wait"):
+                time.sleep(delay)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "pool_size": self.pool_size,
+                "in_flight": self._in_flight,
+                "saturation": round(self._in_flight / self.pool_size, 3) if self.pool_size else 0,
+                "breaker_state": self.breaker.state,
+                **self.stale.stats(),
+            }
+
+    def _enter(self) -> None:
+        with self._lock:
+            self._stats["requests"] += 1
+            if self._in_flight >= self.pool_size:
+                self._stats["saturated_calls"] += 1
+            self._in_flight += 1
+            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._in_flight)
+
+    def _leave(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+
+# Full jitter exponential backoff
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def _retry_after(e: ApiException) -> Optional[float]:
+    value = (e.headers or {}).get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), BACKOFF_MAX)
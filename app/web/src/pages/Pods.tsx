@@ -15,6 +15,7 @@ const Pods = () => {
   const [selectedPod, setSelectedPod] = useState<any>(null);
   const [logs, setLogs] = useState<string>('');
   const [podYaml, setPodYaml] = useState('');
+  const [events, setEvents] = useState<any[]>([]);
   const [loadingLogs, setLoadingLogs] = useState(false);
 
   const { data: podsData, isLoading, error, refetch } = useQuery({
@@ -31,21 +32,26 @@ const Pods = () => {
     setSelectedPod(pod);
     setLogs('');
     setPodYaml('');
+    setEvents([]);
     setLoadingLogs(true);
 
     try {
-      const res = await fetch(`/api/pods/${pod.namespace}/${pod.name}`);
-      const fullPod = await res.json();
-      setPodYaml(yaml.dump(fullPod));
-    } catch {
-      setPodYaml('Failed to load full pod YAML.');
-    }
+      const res = await fetch(`/api/pods/${pod.namespace}/${pod.name}/inspect`);
+      const data = await res.json();
+      setPodYaml(data.pod ? yaml.dump(data.pod) : 'Failed to load full pod YAML.');
 
-    try {
-      const logRes = await fetch(`/api/logs?podName=${pod.name}&namespace=${pod.namespace}`);
-      const data = await logRes.json();
-      setLogs(data.logs || 'No logs found.');
+      const containers = Object.entries(data.logs || {});
+      const combined = containers
+          .map(([container, text]) => {
+            const body = text ?? `Failed to fetch logs: ${data.errors?.[`logs.${container}`] || 'unknown error'}`;
+            // Lines are rendered newest first, so the container header goes after its logs
+            return containers.length > 1 ? `${body}\n=== ${container} ===` : body;
+          })
+          .join('\n');
+      setLogs(combined || 'No logs found.');
+      setEvents([...(data.events || []), ...(data.deployment?.events || [])]);
     } catch {
+      setPodYaml('Failed to load full pod YAML.');
       setLogs('Failed to fetch logs.');
     }
 
@@ -161,6 +167,7 @@ const Pods = () => {
                       setSelectedPod(null);
                       setLogs('');
                       setPodYaml('');
+                      setEvents([]);
                     }}
                     className="text-sm text-muted-foreground ml-4"
                 >
@@ -203,6 +210,30 @@ const Pods = () => {
                   )}
                 </div>
               </div>
+
+              {events.length > 0 && (
+                  <div className="mt-8">
+                    <h3 className="font-bold mb-2">Events</h3>
+                    <div className="border rounded overflow-auto max-h-96 bg-zinc-100 dark:bg-zinc-800">
+                      <table className="min-w-full text-sm">
+                        <tbody className="divide-y divide-zinc-200 dark:divide-zinc-700">
+                        {events.map((event, idx) => (
+                            <tr key={idx}>
+                              <td className="px-4 py-2 whitespace-nowrap">
+                                <Badge variant={event.type === 'Warning' ? 'destructive' : 'secondary'}>{event.reason}</Badge>
+                              </td>
+                              <td className="px-4 py-2 text-zinc-800 dark:text-zinc-100 break-words">
+                                {event.message}
+                                {event.count > 1 && <span className="text-xs text-gray-500"> (x{event.count})</span>}
+                              </td>
+                              <td className="px-4 py-2 text-xs text-gray-500 whitespace-nowrap">{formatAge(event.lastTimestamp)}</td>
+                            </tr>
+                        ))}
+                        </tbody>
+                      </table>
+                    </div>
+                  </div>
+              )}
             </div>
         )}
       </Layout>